@@ -12,12 +12,20 @@ try:
     from face_detector import detect_photo
     from checkbox import detect_checkboxes
     from fusion import fuse_results
+    from profiler import SlowDocumentCapture
     from pdf2image import convert_from_bytes
 except ImportError as e:
     st.error(f" Erreur d'import : {e}")
     st.info("Assurez-vous d'avoir installé les dépendances : pdf2image, pillow, opencv-python, streamlit")
 
 
+# Capture des documents lents (désactivée si DIGITUP_SLOW_MS n'est pas défini)
+try:
+    SLOW_CAPTURE = SlowDocumentCapture.from_env()
+except NameError:
+    SLOW_CAPTURE = None
+
+
 # Configuration de la page
 st.set_page_config(
     page_title="Analyseur de Documents Administratifs",
@@ -120,6 +128,31 @@ def analyze_document(image):
     Args:
         image: Image PIL du document
     
+    Returns:
+        dict: Dictionnaire contenant tous les résultats d'analyse
+    """
+    # Convertir l'image PIL en format compatible (numpy array)
+    img_array = np.array(image)
+
+    # Capture des documents lents (opt-in via DIGITUP_SLOW_MS)
+    if SLOW_CAPTURE is not None:
+        settings = {
+            "source": "app",
+            "color_order": "RGB",
+            "image_mode": image.mode
+        }
+        return SLOW_CAPTURE.run(run_analysis, img_array, settings)
+
+    return run_analysis(img_array)
+
+
+def run_analysis(img_array):
+    """
+    Appelle successivement tous les modules de détection sur l'image
+    
+    Args:
+        img_array: Image du document (numpy array)
+    
     Returns:
         dict: Dictionnaire contenant tous les résultats d'analyse
     """
@@ -135,9 +168,6 @@ def analyze_document(image):
         "errors": []
     }
     
-    # Convertir l'image PIL en format compatible (numpy array)
-    img_array = np.array(image)
-    
     try:
         # 1. Extraction du texte OCR
         st.info("🔍 Extraction du texte...")
@@ -0,0 +1,207 @@
+# batch_store.py
+import glob
+import json
+import os
+
+import numpy as np
+
+# Colonnes scalaires typées (une colonne numpy par champ)
+SCALAR_COLUMNS = {
+    "ocr_confidence": np.float32,
+    "signature_score": np.float32,
+    "global_score": np.float32,
+    "photo_found": np.bool_,
+    "signature_present": np.bool_,
+    "n_checkboxes": np.int32,
+}
+
+# Champs imbriqués / volumineux, stockés à part et chargés à la demande
+NESTED_FIELDS = ("text", "checkboxes", "words", "lines", "links")
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable : {type(value)}")
+
+
+def _scalar(value, dtype):
+    if dtype is np.bool_:
+        return bool(value)
+    return np.nan if value is None else value
+
+
+class ResultStore:
+    """
+    Columnar sink for fused results.
+
+    Results are buffered and written in chunks:
+    - chunk_XXXXX.npz   : one typed numpy column per scalar field
+    - chunk_XXXXX.jsonl : nested fields (text, checkboxes, words, lines, links), one line per row
+
+    The npz also holds the byte offset of each row in the jsonl file, so nested
+    fields can be read for a single row without parsing the whole chunk.
+    """
+
+    def __init__(self, directory, chunk_size=10000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        # Prochain numéro = plus grand existant + 1 (un trou dans la numérotation
+        # ne doit pas faire écraser un chunk)
+        numbers = [_chunk_number(path) for path in _chunk_paths(directory)]
+        self.n_chunks = max(numbers) + 1 if numbers else 0
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self.columns = {name: [] for name in SCALAR_COLUMNS}
+        self.nested = []
+
+    def __len__(self):
+        return len(self.nested)
+
+    def add(self, result):
+        """
+        Buffer one fuse_results output.
+        """
+        for name, dtype in SCALAR_COLUMNS.items():
+            if name == "n_checkboxes":
+                self.columns[name].append(len(result.get("checkboxes") or []))
+            else:
+                self.columns[name].append(_scalar(result.get(name), dtype))
+
+        self.nested.append({k: result[k] for k in NESTED_FIELDS if k in result})
+
+        if len(self.nested) >= self.chunk_size:
+            self.flush()
+
+    def add_batch(self, batch):
+        """
+        Buffer a fuse_results_batch output (columns instead of rows).
+        """
+        n = len(batch["global_score"])
+        checkboxes = batch.get("checkboxes") or [[] for _ in range(n)]
+
+        start = 0
+        while start < n:
+            # Remplir le buffer jusqu'à la taille d'un chunk
+            stop = min(n, start + self.chunk_size - len(self.nested))
+
+            for name in SCALAR_COLUMNS:
+                if name == "n_checkboxes":
+                    self.columns[name].extend(len(cbs or []) for cbs in checkboxes[start:stop])
+                else:
+                    self.columns[name].extend(np.asarray(batch[name][start:stop]).tolist())
+
+            for i in range(start, stop):
+                self.nested.append({k: batch[k][i] for k in NESTED_FIELDS if k in batch})
+
+            if len(self.nested) >= self.chunk_size:
+                self.flush()
+            start = stop
+
+    def flush(self):
+        """
+        Write the buffered rows as a new chunk.
+        """
+        if not self.nested:
+            return
+
+        base = os.path.join(self.directory, f"chunk_{self.n_chunks:05d}")
+
+        offsets = []
+        with open(base + ".jsonl", "wb") as f:
+            for row in self.nested:
+                offsets.append(f.tell())
+                f.write(json.dumps(row, ensure_ascii=False, default=_to_builtin).encode("utf-8"))
+                f.write(b"\n")
+
+        arrays = {
+            name: np.asarray(self.columns[name], dtype=dtype)
+            for name, dtype in SCALAR_COLUMNS.items()
+        }
+        arrays["_offsets"] = np.asarray(offsets, dtype=np.int64)
+        np.savez(base + ".npz", **arrays)
+
+        self.n_chunks += 1
+        self._reset_buffer()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _chunk_number(path):
+    return int(os.path.basename(path)[len("chunk_"):-len(".npz")])
+
+
+def _chunk_paths(directory):
+    paths = glob.glob(os.path.join(directory, "chunk_[0-9]*.npz"))
+    return sorted(paths, key=_chunk_number)
+
+
+def load_columns(directory, columns=None):
+    """
+    Load scalar columns of every chunk as concatenated numpy arrays.
+    """
+    columns = list(columns or SCALAR_COLUMNS)
+    parts = {name: [] for name in columns}
+
+    for path in _chunk_paths(directory):
+        with np.load(path) as data:
+            for name in columns:
+                parts[name].append(data[name])
+
+    return {
+        name: np.concatenate(arrays) if arrays else np.array([], dtype=SCALAR_COLUMNS[name])
+        for name, arrays in parts.items()
+    }
+
+
+class ResultReader:
+    """
+    Read access to a ResultStore directory.
+    The row offsets of every chunk are loaded once, so reading the nested
+    fields of one row is a binary search plus a single seek in one file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = _chunk_paths(directory)
+        self.offsets = []
+
+        for path in self.paths:
+            with np.load(path) as data:
+                self.offsets.append(data["_offsets"])
+
+        # starts[i] = index global de la première ligne du chunk i
+        counts = np.array([len(o) for o in self.offsets], dtype=np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def load_columns(self, columns=None):
+        return load_columns(self.directory, columns)
+
+    def load_nested(self, row):
+        """
+        Lazily load the nested fields (text, checkboxes, ...) of a single row.
+        """
+        if row < 0 or row >= len(self):
+            raise IndexError(f"Ligne inexistante : {row}")
+
+        chunk = int(np.searchsorted(self.starts, row, side="right")) - 1
+        offset = self.offsets[chunk][row - self.starts[chunk]]
+
+        with open(self.paths[chunk][:-len(".npz")] + ".jsonl", "rb") as f:
+            f.seek(int(offset))
+            return json.loads(f.readline().decode("utf-8"))
@@ -1,6 +1,13 @@
 # checkbox.py
 import cv2
 
+# Taille d'une case (px), seuil adaptatif et taux de remplissage d'une case cochée
+MIN_SIZE = 20
+MAX_SIZE = 80
+THRESHOLD_BLOCK = 31
+THRESHOLD_C = 5
+FILL_THRESHOLD = 0.25
+
 def detect_checkboxes(image):
     """
     Detects squares (potential checkboxes).
@@ -9,7 +16,7 @@ def detect_checkboxes(image):
 
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     thresh = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 5
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, THRESHOLD_BLOCK, THRESHOLD_C
     )
 
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -19,11 +26,11 @@ def detect_checkboxes(image):
     for cnt in contours:
         x, y, w, h = cv2.boundingRect(cnt)
 
-        if 20 < w < 80 and 20 < h < 80:  # checkbox size range
+        if MIN_SIZE < w < MAX_SIZE and MIN_SIZE < h < MAX_SIZE:  # checkbox size range
             roi = thresh[y:y+h, x:x+w]
             filled = (roi > 0).sum() / (roi.size)
 
-            checked = filled > 0.25  # threshold for "checked"
+            checked = filled > FILL_THRESHOLD  # threshold for "checked"
 
             boxes.append({
                 "box": (int(x), int(y), int(w), int(h)),
@@ -0,0 +1,626 @@
+# dedup.py
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Seuils calibrés avec notebooks/dedup_calibration.py (formulaires synthétiques :
+# rescans décalés jusqu'à 40 px, dpi x0.75 à x1.3, rotation jusqu'à 1°, JPEG q60).
+
+# 1) Regroupement par modèle de formulaire : pHash de la page (rescans <= 20 bits),
+#    confirmé par la part de l'encre du modèle retrouvée sur la page recalée
+#    (exemplaires et rescans >= 0.89, autres formulaires <= 0.58).
+TEMPLATE_DISTANCE = 23
+TEMPLATE_COVERAGE = 0.75
+MAX_TEMPLATES = 3
+
+# 2) Clé de contenu : SimHash de ce qui a été rempli (page recalée moins le
+#    modèle appris sur les premiers exemplaires). Rescans <= 8 bits, autres
+#    exemplaires du même modèle >= 10 bits.
+CONTENT_RADIUS = 10
+MAX_CANDIDATES = 8
+MAX_SCAN = 10000
+TEMPLATE_SAMPLES = 4
+
+# En dessous de cette quantité d'encre propre à la page (pixels de la miniature),
+# le résidu n'est que du bruit de recalage : la page reçoit le code 0.
+CODE_MIN_INK = 5.0
+
+# 3) Filtre rapide sur miniature avant la relecture des mots (orienté rappel :
+#    il écarte les pages clairement différentes, il ne prouve pas l'identité).
+CONTENT_DISTANCE = 0.01
+BLOCK_DISTANCE = 3.0
+
+THUMB_SIZE = 512
+GATE_SIZE = 256
+CODE_SIZE = 64
+BLOCK_SIZE = 16
+INK_MIN = 0.25
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Projections aléatoires (graine fixe) du SimHash de contenu
+_PROJECTIONS = np.random.default_rng(20240601).standard_normal(
+    (HASH_BITS, CODE_SIZE * CODE_SIZE)
+).astype(np.float32)
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable : {type(value)}")
+
+
+def normalize_page(image, size=32):
+    """
+    Normalize a page before hashing: grayscale, downscale, histogram equalization.
+    Removes most of the dpi / compression / lighting differences between scans.
+    """
+    small = cv2.resize(_to_gray(image), (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.equalizeHist(small)
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def compute_phash(image):
+    """
+    Perceptual hash (DCT of the normalized page, 8x8 low frequencies vs median).
+    The DC term is excluded (its bit is always 0): otherwise it dominates and
+    all near-uniform pages collide on the same hash.
+    """
+    page = np.float32(normalize_page(image, 32))
+    coeffs = cv2.dct(page)[:8, :8].flatten()
+    bits = coeffs > np.median(coeffs[1:])
+    bits[0] = False
+    return _bits_to_int(bits)
+
+
+def page_digest(image):
+    """
+    Exact fingerprint of the decoded pixels (same file uploaded twice).
+    """
+    image = np.ascontiguousarray(image)
+    digest = hashlib.sha1(str(image.shape).encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def page_thumbnail(image):
+    """
+    Grayscale THUMB_SIZE x THUMB_SIZE thumbnail of the page.
+    """
+    return cv2.resize(_to_gray(image), (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def encode_png(image):
+    _, png = cv2.imencode(".png", image)
+    return png.tobytes()
+
+
+def decode_png(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def _ink(thumb):
+    """
+    Ink intensity in [0, 1], relative to the paper background (robust to lighting).
+    """
+    thumb = np.float32(thumb)
+    background = max(float(np.percentile(thumb, 90)), 1.0)
+    return np.clip((background - thumb) / background, 0, 1)
+
+
+def register(ref_thumb, thumb):
+    """
+    Rigid transform (2x3, rotation + translation) mapping `ref_thumb`
+    coordinates onto `thumb` coordinates: phase correlation for the
+    translation, refined by ECC. Returns None if the pages cannot be aligned.
+    """
+    ref = _ink(ref_thumb)
+    cur = _ink(thumb)
+
+    window = cv2.createHanningWindow(ref.shape[::-1], cv2.CV_32F)
+    (dx, dy), _ = cv2.phaseCorrelate(ref, cur, window)
+    warp = np.float32([[1, 0, dx], [0, 1, dy]])
+
+    sigma = ref.shape[0] / 256
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-5)
+    try:
+        _, warp = cv2.findTransformECC(
+            cv2.GaussianBlur(ref, (0, 0), sigma), cv2.GaussianBlur(cur, (0, 0), sigma),
+            warp, cv2.MOTION_EUCLIDEAN, criteria, None, 1
+        )
+    except cv2.error:
+        return None
+
+    return warp
+
+
+def _scale_warp(warp, factor):
+    scaled = warp.copy()
+    scaled[:, 2] *= factor
+    return scaled
+
+
+def content_distance(ref_thumb, thumb, warp):
+    """
+    Compare two thumbnails once aligned (2 px tolerance), at GATE_SIZE.
+    Returns (global, local):
+    - global : fraction of the ink that has no counterpart on the other page
+    - local  : largest unmatched ink in a single BLOCK_SIZE block
+    """
+    size = (GATE_SIZE, GATE_SIZE)
+    ref = cv2.resize(ref_thumb, size, interpolation=cv2.INTER_AREA)
+    cur = _ink(cv2.resize(thumb, size, interpolation=cv2.INTER_AREA))
+    warp = _scale_warp(warp, GATE_SIZE / ref_thumb.shape[0])
+    ref = cv2.warpAffine(_ink(ref), warp, size)
+
+    total = float(ref.sum() + cur.sum())
+    if total == 0:
+        return 0.0, 0.0
+
+    kernel = np.ones((5, 5), np.uint8)
+    unmatched = (
+        np.clip(ref - cv2.dilate(cur, kernel), 0, None)
+        + np.clip(cur - cv2.dilate(ref, kernel), 0, None)
+    )
+    unmatched[unmatched < INK_MIN] = 0
+
+    n = GATE_SIZE // BLOCK_SIZE
+    blocks = unmatched.reshape(n, BLOCK_SIZE, n, BLOCK_SIZE).sum(axis=(1, 3))
+    return float(unmatched.sum()) / total, float(blocks.max())
+
+
+def map_box(box, warp, old_shape, new_shape):
+    """
+    Re-register a box (x, y, w, h) from the page it was detected on onto the
+    current page, given the thumbnail transform and both page shapes (h, w).
+    """
+    x, y, w, h = box[:4]
+    old_h, old_w = old_shape[:2]
+    new_h, new_w = new_shape[:2]
+
+    corners = np.float32([[x, y], [x + w, y], [x, y + h], [x + w, y + h]])
+    corners *= np.float32([THUMB_SIZE / old_w, THUMB_SIZE / old_h])
+    corners = corners @ warp[:, :2].T + warp[:, 2]
+    corners *= np.float32([new_w / THUMB_SIZE, new_h / THUMB_SIZE])
+
+    x0, y0 = corners.min(axis=0)
+    x1, y1 = corners.max(axis=0)
+    return (int(round(x0)), int(round(y0)), int(round(x1 - x0)), int(round(y1 - y0)))
+
+
+def align_on(rep_thumb, thumb):
+    """
+    Ink of `thumb` registered in the frame of `rep_thumb`, or None if the
+    pages cannot be aligned.
+    """
+    warp = register(rep_thumb, thumb)
+    if warp is None:
+        return None
+
+    size = rep_thumb.shape[::-1]
+    return cv2.warpAffine(_ink(thumb), warp, size, flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+
+
+def template_coverage(aligned, template_ink):
+    """
+    Fraction of the template ink found on the aligned page (2 px tolerance):
+    every copy of a form carries the whole template.
+    """
+    total = float(template_ink.sum())
+    if total == 0:
+        return 0.0
+    covered = np.minimum(template_ink, cv2.dilate(aligned, np.ones((5, 5), np.uint8)))
+    return float(covered.sum()) / total
+
+
+def fill_residual(aligned, template_ink):
+    """
+    Ink of the aligned page that is not part of the template (what was filled in).
+    """
+    residual = np.clip(aligned - cv2.dilate(template_ink, np.ones((5, 5), np.uint8)), 0, None)
+    residual[residual < INK_MIN] = 0
+    return residual
+
+
+def content_code(aligned, template_ink):
+    """
+    64-bit SimHash of what was filled in on the page (see fill_residual),
+    projected on fixed random directions.
+    Pages with almost nothing of their own (a few letters that change) get
+    code 0: they are only told apart by re-reading their words.
+    """
+    residual = fill_residual(aligned, template_ink)
+    if residual.sum() < CODE_MIN_INK:
+        return 0
+
+    residual = cv2.GaussianBlur(residual, (0, 0), THUMB_SIZE / 256)
+    residual = cv2.resize(residual, (CODE_SIZE, CODE_SIZE), interpolation=cv2.INTER_AREA)
+
+    return _bits_to_int((_PROJECTIONS @ residual.flatten()) > 0)
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+_MASKS = {}
+
+
+def _masks(radius, bits=CHUNK_BITS):
+    """
+    All `bits`-bit masks with exactly `radius` bits set (cached).
+    """
+    if radius not in _MASKS:
+        masks = [0]
+        for _ in range(radius):
+            masks = {m | (1 << i) for m in masks for i in range(bits) if not m & (1 << i)}
+        _MASKS[radius] = sorted(masks)
+    return _MASKS[radius]
+
+
+class HashIndex:
+    """
+    Multi-index hashing over 64-bit hashes.
+
+    The hash is split into 4 chunks of 16 bits, each stored in its own table.
+    If two hashes are within distance r, at least one chunk is within r // 4
+    (pigeonhole). Queries probe chunk radius 0, 1, 2... in turn, so results
+    come out nearest first and the search stops as soon as `limit` results
+    are known (or `max_scan` entries have been examined).
+    """
+
+    def __init__(self):
+        self.hashes = []
+        self.items = []
+        self.tables = [dict() for _ in range(CHUNKS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _chunks(self, h):
+        return [(h >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, h, item):
+        idx = len(self.hashes)
+        self.hashes.append(h)
+        self.items.append(item)
+
+        for table, chunk in zip(self.tables, self._chunks(h)):
+            table.setdefault(chunk, []).append(idx)
+
+        return idx
+
+    def query(self, h, max_distance, limit=None, max_scan=None):
+        """
+        Entries within `max_distance`, nearest first: [(distance, item), ...]
+        """
+        chunks = self._chunks(h)
+        seen = set()
+        pending = []
+        results = []
+
+        for radius in range(max_distance // CHUNKS + 1):
+            for table, chunk in zip(self.tables, chunks):
+                for mask in _masks(radius):
+                    for idx in table.get(chunk ^ mask, ()):
+                        if idx in seen:
+                            continue
+                        seen.add(idx)
+
+                        dist = hamming_distance(h, self.hashes[idx])
+                        if dist > max_distance:
+                            continue
+
+                        # Aucune entrée non vue ne peut être plus proche que CHUNKS * radius
+                        if dist <= CHUNKS * radius:
+                            results.append((dist, self.items[idx]))
+                            if limit is not None and len(results) >= limit:
+                                return results
+                        else:
+                            pending.append((dist, idx))
+
+                        if max_scan is not None and len(seen) >= max_scan:
+                            pending.sort()
+                            results.extend((d, self.items[i]) for d, i in pending)
+                            return results[:limit]
+
+            # Après ce rayon, toutes les entrées à moins de CHUNKS * (radius + 1) sont connues
+            pending.sort()
+            bound = CHUNKS * (radius + 1) - 1
+            while pending and pending[0][0] <= bound:
+                dist, idx = pending.pop(0)
+                results.append((dist, self.items[idx]))
+                if limit is not None and len(results) >= limit:
+                    return results
+
+        return results
+
+
+class BlobStore:
+    """
+    Append-only binary store keyed by dense integer ids: payloads live on disk
+    (or in memory if no path is given), only their offsets are kept in RAM.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.offsets = []
+        self.lengths = []
+
+        if path is None:
+            self.file = io.BytesIO()
+        else:
+            self.file = open(path, "a+b")
+            if os.path.exists(path + ".idx.npy"):
+                offsets, lengths = np.load(path + ".idx.npy")
+                self.offsets, self.lengths = offsets.tolist(), lengths.tolist()
+
+    def put(self, key, data):
+        self.file.seek(0, io.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(data)
+
+        if key == len(self.offsets):
+            self.offsets.append(offset)
+            self.lengths.append(len(data))
+        else:
+            self.offsets[key] = offset
+            self.lengths[key] = len(data)
+
+    def get(self, key):
+        self.file.seek(self.offsets[key])
+        return self.file.read(self.lengths[key])
+
+    def save(self):
+        if self.path is None:
+            return
+        self.file.flush()
+        np.save(self.path + ".idx.npy", np.array([self.offsets, self.lengths], dtype=np.int64))
+
+
+class DuplicateIndex:
+    """
+    Index of processed pages, used to find copies of a page before OCR.
+
+    - exact copies (same decoded pixels) are found by digest;
+    - near copies (rescans) go through two levels of HashIndex: the pHash finds
+      the form template, then a content code (what was filled in) finds the
+      entries of that template that may be the same document.
+
+    Results, thumbnails and template images are stored out of line in
+    BlobStores keyed by entry / template id; `directory` makes them persistent.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        def blobs(name):
+            return BlobStore(os.path.join(directory, name) if directory else None)
+
+        self.results = blobs("results.bin")
+        self.thumbnails = blobs("thumbnails.bin")
+        self.representatives = blobs("representatives.bin")
+        self.template_inks = blobs("templates.bin")
+
+        self.templates = HashIndex()
+        self.template_members = []
+        self.contents = []
+        self._template_cache = OrderedDict()
+
+        self.digests = {}
+        self.entry_template = []
+        self.entry_code = []
+        self.entry_shape = []
+
+        if directory is not None and os.path.exists(os.path.join(directory, "index.npz")):
+            self._load()
+
+    def __len__(self):
+        return len(self.entry_template)
+
+    # --- stockage ---------------------------------------------------------
+
+    def result(self, entry):
+        """
+        Fused result of an entry (a fresh copy: callers may modify it).
+        """
+        return json.loads(self.results.get(entry).decode("utf-8"))
+
+    def thumbnail(self, entry):
+        return decode_png(self.thumbnails.get(entry))
+
+    def shape(self, entry):
+        return self.entry_shape[entry]
+
+    def _template(self, template):
+        """
+        (representative thumbnail, template ink) of a template, with a small LRU cache.
+        """
+        if template in self._template_cache:
+            self._template_cache.move_to_end(template)
+            return self._template_cache[template]
+
+        rep = decode_png(self.representatives.get(template))
+        ink = np.float32(decode_png(self.template_inks.get(template))) / 255
+        self._template_cache[template] = (rep, ink)
+        if len(self._template_cache) > 64:
+            self._template_cache.popitem(last=False)
+        return rep, ink
+
+    def _set_template_ink(self, template, ink):
+        self.template_inks.put(template, encode_png(np.uint8(np.round(ink * 255))))
+        self._template_cache.pop(template, None)
+
+    # --- recherche --------------------------------------------------------
+
+    def find_exact(self, digest):
+        return self.digests.get(digest)
+
+    def _matching_templates(self, page_hash, thumb):
+        """
+        Templates the page is a copy of, with the page ink aligned on each:
+        [(template, aligned), ...] (at most MAX_TEMPLATES).
+        """
+        matches = []
+        for _, template in self.templates.query(page_hash, TEMPLATE_DISTANCE, limit=MAX_TEMPLATES):
+            rep, ink = self._template(template)
+            aligned = align_on(rep, thumb)
+            if aligned is not None and template_coverage(aligned, ink) >= TEMPLATE_COVERAGE:
+                matches.append((template, aligned))
+        return matches
+
+    def candidates(self, page_hash, thumb):
+        """
+        Entries that may be the same document as the page, nearest content first:
+        [(entry, content_distance), ...] (at most MAX_CANDIDATES).
+        """
+        found = []
+        for template, aligned in self._matching_templates(page_hash, thumb):
+            code = content_code(aligned, self._template(template)[1])
+            found.extend(self.contents[template].query(
+                code, CONTENT_RADIUS, limit=MAX_CANDIDATES, max_scan=MAX_SCAN
+            ))
+
+        found.sort()
+        return [(entry, dist) for dist, entry in found[:MAX_CANDIDATES]]
+
+    def verified_candidates(self, page_hash, thumb):
+        """
+        Candidates that pass the thumbnail check, with the transform mapping
+        the candidate's page onto the current one: [(entry, warp), ...]
+        """
+        verified = []
+        for entry, _ in self.candidates(page_hash, thumb):
+            ref = self.thumbnail(entry)
+            warp = register(ref, thumb)
+            if warp is None:
+                continue
+
+            global_diff, local_diff = content_distance(ref, thumb, warp)
+            if global_diff <= CONTENT_DISTANCE and local_diff <= BLOCK_DISTANCE:
+                verified.append((entry, warp))
+
+        return verified
+
+    # --- ajout ------------------------------------------------------------
+
+    def _new_template(self, page_hash, thumb):
+        template = len(self.template_members)
+        self.representatives.put(template, encode_png(thumb))
+        self._set_template_ink(template, _ink(thumb))
+        self.templates.add(page_hash, template)
+        self.template_members.append([])
+        self.contents.append(HashIndex())
+        return template
+
+    def _learn_template(self, template, aligned):
+        """
+        Template ink = pixelwise minimum over the first TEMPLATE_SAMPLES pages
+        (what every copy has in common). Codes of these first members are
+        recomputed since the template changed.
+        """
+        _, ink = self._template(template)
+        self._set_template_ink(template, np.minimum(ink, aligned))
+
+        rep, ink = self._template(template)
+        index = HashIndex()
+        for entry in self.template_members[template]:
+            member = align_on(rep, self.thumbnail(entry))
+            self.entry_code[entry] = content_code(member, ink) if member is not None else 0
+            index.add(self.entry_code[entry], entry)
+        self.contents[template] = index
+
+    def add(self, page_hash, thumb, digest, shape, result):
+        """
+        Add a fully computed page. Returns its entry id.
+        """
+        matches = self._matching_templates(page_hash, thumb)
+        if matches:
+            template, aligned = matches[0]
+        else:
+            template = self._new_template(page_hash, thumb)
+            aligned = _ink(thumb)
+
+        entry = len(self.entry_template)
+        self.results.put(entry, json.dumps(result, ensure_ascii=False, default=_to_builtin).encode("utf-8"))
+        self.thumbnails.put(entry, encode_png(thumb))
+        self.entry_template.append(template)
+        self.entry_code.append(0)
+        self.entry_shape.append(list(shape[:2]))
+        self.digests[digest] = entry
+
+        members = self.template_members[template]
+        if len(members) < TEMPLATE_SAMPLES:
+            members.append(entry)
+            self._learn_template(template, aligned)
+        else:
+            self.entry_code[entry] = content_code(aligned, self._template(template)[1])
+            self.contents[template].add(self.entry_code[entry], entry)
+
+        return entry
+
+    # --- persistance ------------------------------------------------------
+
+    def save(self):
+        if self.directory is None:
+            return
+
+        for store in (self.results, self.thumbnails, self.representatives, self.template_inks):
+            store.save()
+
+        members = np.full((len(self.template_members), TEMPLATE_SAMPLES), -1, dtype=np.int64)
+        for template, entries in enumerate(self.template_members):
+            members[template, :len(entries)] = entries
+
+        digests = [""] * len(self.entry_template)
+        for digest, entry in self.digests.items():
+            digests[entry] = digest
+
+        np.savez(
+            os.path.join(self.directory, "index.npz"),
+            template_hash=np.array(self.templates.hashes, dtype=np.uint64),
+            template_members=members,
+            entry_template=np.array(self.entry_template, dtype=np.int64),
+            entry_code=np.array(self.entry_code, dtype=np.uint64),
+            entry_shape=np.array(self.entry_shape, dtype=np.int64).reshape(-1, 2),
+            entry_digest=np.array(digests, dtype="U40"),
+        )
+
+    def _load(self):
+        with np.load(os.path.join(self.directory, "index.npz")) as data:
+            for template, h in enumerate(data["template_hash"].tolist()):
+                self.templates.add(h, template)
+                self.template_members.append([e for e in data["template_members"][template].tolist() if e >= 0])
+                self.contents.append(HashIndex())
+
+            self.entry_template = data["entry_template"].tolist()
+            self.entry_code = data["entry_code"].tolist()
+            self.entry_shape = data["entry_shape"].tolist()
+            self.digests = {d: entry for entry, d in enumerate(data["entry_digest"].tolist())}
+
+        for entry, (template, code) in enumerate(zip(self.entry_template, self.entry_code)):
+            self.contents[template].add(code, entry)
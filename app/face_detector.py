@@ -1,6 +1,10 @@
 # photo.py
 import cv2
 
+# Paramètres de detectMultiScale
+SCALE_FACTOR = 1.2
+MIN_NEIGHBORS = 5
+
 def detect_photo(image):
     """
     Detect face using Haarcascade (fast + simple).
@@ -13,7 +17,7 @@ def detect_photo(image):
 
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5)
+    faces = face_cascade.detectMultiScale(gray, scaleFactor=SCALE_FACTOR, minNeighbors=MIN_NEIGHBORS)
 
     if len(faces) == 0:
         return False, None
@@ -1,14 +1,25 @@
 # fusion.py
+import numpy as np
+
+from layout import assign_lines, build_word_index, link_checkboxes, link_signature_zones
+
+
 def fuse_results(
     ocr_text="",
     ocr_conf=0.0,
     signature_present=False,
     signature_score=0.0,
     photo_found=False,
-    checkboxes=None
+    checkboxes=None,
+    words=None,
+    lines=None,
+    signature_zones=None
 ):
     """
     Combine OCR, signature, photo, and checkbox results into a structured dictionary.
+    If OCR words (with boxes) are given, checkboxes and signature zones are linked
+    to their nearest label / caption; text lines (see layout.assign_lines) are
+    kept alongside the words.
     """
 
     # Sécurise checkboxes
@@ -36,7 +47,7 @@ def fuse_results(
     # Calcul score global sécurisé
     global_score = sum(score_components) / len(score_components) if score_components else 0
 
-    return {
+    result = {
         "text": ocr_text,
         "ocr_confidence": ocr_conf,
         "signature_present": signature_present,
@@ -45,3 +56,88 @@ def fuse_results(
         "checkboxes": checkboxes,
         "global_score": float(global_score)
     }
+
+    # Liens spatiaux mots <-> cases / zones de signature
+    if words is not None:
+        word_index = build_word_index(words)
+        result["words"] = words
+        result["lines"] = lines if lines is not None else assign_lines(words)[1]
+        result["links"] = {
+            "checkboxes": link_checkboxes(checkboxes, word_index),
+            "signatures": link_signature_zones(signature_zones or [], word_index)
+        }
+
+    return result
+
+
+def fuse_results_batch(
+    ocr_texts,
+    ocr_confs,
+    signature_presents,
+    signature_scores,
+    photo_founds,
+    checkboxes_list=None,
+    words_list=None,
+    lines_list=None,
+    signature_zones_list=None
+):
+    """
+    Vectorized version of fuse_results for a whole batch of pages.
+    Same scoring as fuse_results, but returns columns instead of one dict per page:
+    numpy arrays for the scalar fields, lists for text and checkboxes.
+    If OCR words are given, "words", "lines" and "links" columns are added,
+    built per page exactly as in fuse_results.
+    """
+    n = len(ocr_confs)
+    if checkboxes_list is None:
+        checkboxes_list = [[] for _ in range(n)]
+    checkboxes_list = [cbs if cbs is not None else [] for cbs in checkboxes_list]
+
+    # None -> nan -> 0 (même comportement que fuse_results)
+    ocr_conf = np.asarray(ocr_confs, dtype=np.float64)
+    signature_score = np.asarray(signature_scores, dtype=np.float64)
+    photo_found = np.array([bool(p) for p in photo_founds], dtype=bool)
+
+    # Moyenne des fill_ratio par page, sans boucle de calcul par page
+    counts = np.array([len(cbs) for cbs in checkboxes_list], dtype=np.int64)
+    fills = np.array(
+        [b.get("fill_ratio", 0) for cbs in checkboxes_list for b in cbs],
+        dtype=np.float64
+    )
+    sums = np.bincount(np.repeat(np.arange(n), counts), weights=fills, minlength=n)
+    avg_check = np.divide(sums, counts, out=np.zeros(n), where=counts > 0)
+
+    global_score = (
+        np.nan_to_num(ocr_conf) / 100
+        + np.nan_to_num(signature_score)
+        + photo_found
+        + avg_check
+    ) / 4
+
+    batch = {
+        "text": list(ocr_texts),
+        "ocr_confidence": ocr_conf,
+        "signature_present": np.array([bool(s) for s in signature_presents], dtype=bool),
+        "signature_score": signature_score,
+        "photo_found": photo_found,
+        "checkboxes": checkboxes_list,
+        "global_score": global_score
+    }
+
+    # Liens spatiaux : un index par page, pas de version vectorisée
+    if words_list is not None:
+        lines_list = lines_list or [None] * n
+        signature_zones_list = signature_zones_list or [None] * n
+
+        batch["words"] = list(words_list)
+        batch["lines"] = []
+        batch["links"] = []
+        for words, lines, cbs, zones in zip(words_list, lines_list, checkboxes_list, signature_zones_list):
+            word_index = build_word_index(words)
+            batch["lines"].append(lines if lines is not None else assign_lines(words)[1])
+            batch["links"].append({
+                "checkboxes": link_checkboxes(cbs, word_index),
+                "signatures": link_signature_zones(zones or [], word_index)
+            })
+
+    return batch
@@ -0,0 +1,298 @@
+# layout.py
+import math
+
+
+def bbox_to_rect(bbox):
+    """
+    Convert an EasyOCR bbox (4 points [[x, y], ...]) into (x, y, w, h).
+    """
+    xs = [p[0] for p in bbox]
+    ys = [p[1] for p in bbox]
+    x, y = int(min(xs)), int(min(ys))
+    return (x, y, int(max(xs)) - x, int(max(ys)) - y)
+
+
+def rect_distance(a, b):
+    """
+    Gap distance between two rectangles (x, y, w, h); 0 if they overlap.
+    """
+    ax, ay, aw, ah = a[:4]
+    bx, by, bw, bh = b[:4]
+    dx = max(0, bx - (ax + aw), ax - (bx + bw))
+    dy = max(0, by - (ay + ah), ay - (by + bh))
+    return math.hypot(dx, dy)
+
+
+def _center_distance(a, b):
+    return math.hypot(
+        (a[0] + a[2] / 2) - (b[0] + b[2] / 2),
+        (a[1] + a[3] / 2) - (b[1] + b[3] / 2),
+    )
+
+
+class GridIndex:
+    """
+    Uniform grid over rectangles for nearest-neighbor queries.
+    Each rectangle is registered in every cell it overlaps; a query scans
+    rings of cells around the target and stops as soon as no unseen
+    rectangle can be closer than the best one found.
+    """
+
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.rects = []
+        self.items = []
+        self.bounds = None
+
+    def _span(self, rect):
+        x, y, w, h = rect[:4]
+        c = self.cell_size
+        return (int(x // c), int(y // c), int((x + w) // c), int((y + h) // c))
+
+    def insert(self, rect, item):
+        idx = len(self.rects)
+        self.rects.append(rect)
+        self.items.append(item)
+
+        cx0, cy0, cx1, cy1 = self._span(rect)
+        if self.bounds is None:
+            self.bounds = (cx0, cy0, cx1, cy1)
+        else:
+            bx0, by0, bx1, by1 = self.bounds
+            self.bounds = (min(bx0, cx0), min(by0, cy0), max(bx1, cx1), max(by1, cy1))
+
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), []).append(idx)
+
+        return idx
+
+    def _ring(self, span, k):
+        cx0, cy0, cx1, cy1 = span
+        x0, y0, x1, y1 = cx0 - k, cy0 - k, cx1 + k, cy1 + k
+
+        if k == 0:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    yield (cx, cy)
+            return
+
+        for cx in range(x0, x1 + 1):
+            yield (cx, y0)
+            yield (cx, y1)
+        for cy in range(y0 + 1, y1):
+            yield (x0, cy)
+            yield (x1, cy)
+
+    def nearest(self, rect, max_distance=None, accept=None):
+        """
+        Closest stored item to `rect` (gap distance, ties broken by center distance).
+        `accept(item)` can be given to skip items that are not valid candidates.
+        Returns (item, distance) or (None, None).
+        """
+        if not self.rects:
+            return None, None
+
+        span = self._span(rect)
+        seen = set()
+        best = None
+        max_ring = int(max_distance // self.cell_size) + 1 if max_distance is not None else None
+
+        # Nombre d'anneaux nécessaire pour couvrir toute la grille
+        bx0, by0, bx1, by1 = self.bounds
+        limit = max(span[0] - bx0, bx1 - span[2], span[1] - by0, by1 - span[3], 0)
+
+        k = 0
+        while k <= limit and (max_ring is None or k <= max_ring):
+            for cell in self._ring(span, k):
+                for idx in self.cells.get(cell, ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+
+                    if accept is not None and not accept(self.items[idx]):
+                        continue
+
+                    dist = rect_distance(rect, self.rects[idx])
+                    if max_distance is not None and dist > max_distance:
+                        continue
+
+                    key = (dist, _center_distance(rect, self.rects[idx]))
+                    if best is None or key < best[0]:
+                        best = (key, idx)
+
+            # Tout rectangle non vu est à plus de k * cell_size
+            if best is not None and best[0][0] < k * self.cell_size:
+                break
+            k += 1
+
+        if best is None:
+            return None, None
+        return self.items[best[1]], best[0][0]
+
+
+def assign_lines(words):
+    """
+    Group words into text lines (vertical overlap of their boxes).
+    Adds a "line" index to each word, in reading order (top to bottom).
+    Returns (words, lines), lines = [{"line", "text", "box"}, ...] where the
+    box is the union of the line's word boxes and the text follows the
+    reading direction (right to left for arabic lines).
+    """
+    current = -1
+    line_bottom = None
+    members = []
+
+    for word in sorted(words, key=lambda wd: (wd["box"][1], wd["box"][0])):
+        x, y, w, h = word["box"]
+        center = y + h / 2
+
+        if line_bottom is None or center > line_bottom:
+            current += 1
+            line_bottom = y + h
+            members.append([])
+        else:
+            line_bottom = max(line_bottom, y + h)
+
+        word["line"] = current
+        members[-1].append(word)
+
+    lines = []
+    for i, line_words in enumerate(members):
+        arabic = sum(_is_arabic(wd["text"]) for wd in line_words) * 2 > len(line_words)
+        line_words = sorted(line_words, key=lambda wd: wd["box"][0], reverse=arabic)
+
+        x0 = min(wd["box"][0] for wd in line_words)
+        y0 = min(wd["box"][1] for wd in line_words)
+        x1 = max(wd["box"][0] + wd["box"][2] for wd in line_words)
+        y1 = max(wd["box"][1] + wd["box"][3] for wd in line_words)
+
+        lines.append({
+            "line": i,
+            "text": " ".join(wd["text"] for wd in line_words),
+            "box": (x0, y0, x1 - x0, y1 - y0)
+        })
+
+    return words, lines
+
+
+def build_word_index(words, cell_size=100):
+    """
+    Build a GridIndex over OCR words ({"text", "box", "confidence"}).
+    """
+    index = GridIndex(cell_size)
+    for word in words:
+        index.insert(word["box"], word)
+    return index
+
+
+def _overlap_ratio(inner, outer):
+    """
+    Fraction of `inner`'s area covered by `outer`.
+    """
+    ix, iy, iw, ih = inner[:4]
+    ox, oy, ow, oh = outer[:4]
+    w = max(0, min(ix + iw, ox + ow) - max(ix, ox))
+    h = max(0, min(iy + ih, oy + oh) - max(iy, oy))
+    return (w * h) / max(iw * ih, 1)
+
+
+def _is_arabic(text):
+    return any("\u0600" <= ch <= "\u06ff" for ch in text)
+
+
+def _same_row(word, box):
+    """
+    The word's vertical span contains the middle of the box.
+    """
+    _, wy, _, wh = word["box"]
+    middle = box[1] + box[3] / 2
+    return wy <= middle <= wy + wh
+
+
+def _label_side(word, box):
+    """
+    Label on the reading side of the box: right for latin text, left for arabic.
+    """
+    wx, _, ww, _ = word["box"]
+    if _is_arabic(word["text"]):
+        return wx + ww <= box[0] + box[2] / 2
+    return wx >= box[0] + box[2] / 2
+
+
+def _nearest_preferred(word_index, rect, max_distance, filters):
+    """
+    Try each filter in turn (most to least specific) and keep the first hit.
+    """
+    for accept in filters:
+        word, dist = word_index.nearest(rect, max_distance, accept)
+        if word is not None:
+            return word, dist
+    return None, None
+
+
+def link_checkboxes(checkboxes, word_index, max_distance=150):
+    """
+    Associate each checkbox with its OCR label.
+    Words inside the box (an OCR'd tick such as "X") are never labels; among
+    the others, the nearest word on the same row and on the reading side is
+    preferred, then any word on the same row, then the nearest word.
+    Returns [{"box", "checked", "label", "distance"}, ...]
+    """
+    links = []
+    for cb in checkboxes:
+        box = cb["box"]
+
+        def outside(word, box=box):
+            return _overlap_ratio(word["box"], box) < 0.5
+
+        def same_row(word, box=box):
+            return outside(word) and _same_row(word, box)
+
+        def reading_side(word, box=box):
+            return same_row(word) and _label_side(word, box)
+
+        word, dist = _nearest_preferred(
+            word_index, box, max_distance, (reading_side, same_row, outside)
+        )
+        links.append({
+            "box": box,
+            "checked": cb.get("checked", False),
+            "label": word["text"] if word else None,
+            "distance": float(dist) if word else None
+        })
+    return links
+
+
+# Mots qui annoncent une zone de signature (français, anglais, arabe)
+CAPTION_KEYWORDS = (
+    "signature", "signé", "signe", "signed", "visa", "approuvé", "approuve",
+    "توقيع", "التوقيع", "إمضاء", "الإمضاء",
+)
+
+
+def _is_caption(word):
+    text = word["text"].casefold()
+    return any(keyword in text for keyword in CAPTION_KEYWORDS)
+
+
+def link_signature_zones(signature_zones, word_index, max_distance=150):
+    """
+    Associate each signature zone with its caption.
+    Only caption-like words ("Signature", "Lu et approuvé", "توقيع", ...)
+    are candidates: the zone is a wide band at the bottom of the page, and
+    the nearest word around its top edge is usually body text.
+    Returns [{"zone", "caption", "distance"}, ...]
+    """
+    links = []
+    for zone in signature_zones:
+        x, y, w, h = zone[:4]
+
+        word, dist = word_index.nearest((x, y, w, 0), max_distance, _is_caption)
+        links.append({
+            "zone": tuple(zone[:4]),
+            "caption": word["text"] if word else None,
+            "distance": float(dist) if word else None
+        })
+    return links
@@ -3,8 +3,15 @@ import cv2
 import numpy as np
 import easyocr
 
+from layout import bbox_to_rect, assign_lines
+
+# Réglages du lecteur et du prétraitement (relevés par profiler.stage_settings)
+OCR_LANGUAGES = ['en', 'ar']
+OCR_GPU = False
+BLUR_KERNEL = (3, 3)
+
 # Charger le lecteur EasyOCR une seule fois (anglais + arabe)
-reader = easyocr.Reader(['en', 'ar'], gpu=False)
+reader = easyocr.Reader(OCR_LANGUAGES, gpu=OCR_GPU)
 
 def preprocess_for_ocr(image):
     """
@@ -12,15 +19,17 @@ def preprocess_for_ocr(image):
     EasyOCR gère déjà bien le bruit donc on évite les binarizations agressives.
     """
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    gray = cv2.GaussianBlur(gray, BLUR_KERNEL, 0)
     return gray
 
-def extract_text(image):
+def extract_text(image, return_words=False):
     """
     Extract text using EasyOCR.
     Returns:
     - text: str
     - confidence: float (0–100)
+    - words: [{"text", "box": (x, y, w, h), "confidence", "line"}] (only if return_words=True)
+    - lines: [{"line", "text", "box": (x, y, w, h)}] (only if return_words=True)
     """
 
     processed = preprocess_for_ocr(image)
@@ -28,18 +37,90 @@ def extract_text(image):
     results = reader.readtext(processed)
 
     if len(results) == 0:
-        return "", 0.0
+        return ("", 0.0, [], []) if return_words else ("", 0.0)
 
-    # Récupérer texte et confiances
+    # Récupérer texte et confiances (et la géométrie si demandée)
     texts = []
     confidences = []
+    words = []
 
     for (bbox, txt, conf) in results:
         if txt.strip() != "":
             texts.append(txt)
             confidences.append(conf * 100)   # EasyOCR donne une conf entre 0 et 1
 
+            if return_words:
+                words.append({
+                    "text": txt,
+                    "box": bbox_to_rect(bbox),
+                    "confidence": float(conf * 100)
+                })
+
     full_text = " ".join(texts)
     avg_conf = float(np.mean(confidences)) if len(confidences) > 0 else 0.0
 
+    if return_words:
+        return (full_text, avg_conf) + assign_lines(words)
+
     return full_text, avg_conf
+
+
+def recognize_words(image, boxes, margin=0.15):
+    """
+    Read the given word boxes (x, y, w, h) without running text detection.
+    Each box is widened by `margin` of its height to absorb registration errors.
+    Returns [(text, confidence), ...] in the order of `boxes` (None if not read).
+    """
+    processed = preprocess_for_ocr(image)
+    img_h, img_w = processed.shape[:2]
+
+    regions = []
+    for x, y, w, h in boxes:
+        pad = int(round(h * margin))
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(img_w, x + w + pad), min(img_h, y + h + pad)
+        regions.append([x0, x1, y0, y1])
+
+    results = reader.recognize(processed, horizontal_list=regions, free_list=[])
+
+    # EasyOCR renvoie les régions triées : on les retrouve par leur coin haut-gauche
+    readings = {}
+    for bbox, txt, conf in results:
+        readings[(int(bbox[0][0]), int(bbox[0][1]))] = (txt, float(conf * 100))
+
+    return [readings.get((x0, y0)) for x0, x1, y0, y1 in regions]
+
+
+def _normalize_word(text):
+    return " ".join(text.split()).casefold()
+
+
+def recheck_words(image, words):
+    """
+    Re-read the word boxes of a previously processed copy of this page
+    (already mapped onto it). The prior OCR is only kept as a candidate: every
+    word must be read again with exactly the same text (case and spacing
+    aside) -- one letter is enough to tell DUPONT from DUPOND -- otherwise
+    None is returned and the page goes through the full OCR.
+    Returns (text, confidence, words, lines) with the current readings.
+    """
+    if not words:
+        return None
+
+    readings = recognize_words(image, [word["box"] for word in words])
+
+    checked = []
+    for word, reading in zip(words, readings):
+        if reading is None:
+            return None
+
+        txt, conf = reading
+        if _normalize_word(txt) != _normalize_word(word["text"]):
+            return None
+
+        checked.append({"text": txt.strip(), "box": tuple(word["box"]), "confidence": conf})
+
+    # Ordre de lecture d'origine (celui de readtext)
+    full_text = " ".join(word["text"] for word in checked)
+    avg_conf = float(np.mean([word["confidence"] for word in checked]))
+    return (full_text, avg_conf) + assign_lines(checked)
@@ -0,0 +1,276 @@
+# profiler.py
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """
+    Low-overhead sampling profiler for one thread.
+    Periodically records the Python stack of the target thread and aggregates
+    it in the "folded" format (frame;frame;frame count) used by flamegraph.pl
+    and speedscope.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def write_folded(self, path, root=None):
+        """
+        Write the sampled stacks. If `root` (a function name) is given, only
+        the stacks going through it are kept, starting at its frame.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                if root is not None:
+                    frames = stack.split(";")
+                    starts = [i for i, frame in enumerate(frames) if frame.endswith(":" + root)]
+                    if not starts:
+                        continue
+                    stack = ";".join(frames[starts[0]:])
+                f.write(f"{stack} {count}\n")
+
+
+def environment_settings():
+    """
+    Versions and thread settings that influence the run; replay restores the
+    thread counts and warns when the versions differ.
+    """
+    settings = {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+    }
+
+    # EasyOCR tourne sur torch : versions et threads relevés s'ils sont installés
+    try:
+        import torch
+        settings["torch"] = torch.__version__
+        settings["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+
+    try:
+        import easyocr
+        settings["easyocr"] = getattr(easyocr, "__version__", "unknown")
+    except ImportError:
+        pass
+
+    return settings
+
+
+def stage_settings():
+    """
+    Parameters of each pipeline stage, read from the stage modules
+    (modules that are not installed are skipped).
+    """
+    stages = {}
+
+    try:
+        import ocr
+        stages["ocr"] = {
+            "languages": list(ocr.OCR_LANGUAGES),
+            "gpu": ocr.OCR_GPU,
+            "blur_kernel": list(ocr.BLUR_KERNEL),
+        }
+    except ImportError:
+        pass
+
+    try:
+        import signature
+        stages["signature"] = {
+            "band_start": signature.BAND_START,
+            "ink_gray": signature.INK_GRAY,
+            "ink_ratio": signature.INK_RATIO,
+        }
+    except ImportError:
+        pass
+
+    try:
+        import checkbox
+        stages["checkbox"] = {
+            "min_size": checkbox.MIN_SIZE,
+            "max_size": checkbox.MAX_SIZE,
+            "threshold_block": checkbox.THRESHOLD_BLOCK,
+            "threshold_c": checkbox.THRESHOLD_C,
+            "fill_threshold": checkbox.FILL_THRESHOLD,
+        }
+    except ImportError:
+        pass
+
+    try:
+        import face_detector
+        stages["photo"] = {
+            "scale_factor": face_detector.SCALE_FACTOR,
+            "min_neighbors": face_detector.MIN_NEIGHBORS,
+        }
+    except ImportError:
+        pass
+
+    return stages
+
+
+def seed_everything(seed):
+    """
+    Seed every random generator the pipeline may use (random, numpy, torch).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+    try:
+        import torch
+        torch.manual_seed(seed)
+    except ImportError:
+        pass
+
+
+def save_bundle(directory, image, settings, elapsed_ms, sampler=None, seed=None):
+    """
+    Snapshot a slow document into a new `directory/<timestamp>-<ms>ms-<suffix>/`:
+    - input.npy      : decoded input, exactly as given to the pipeline
+    - input.png      : same pixels, lossless, in OpenCV (BGR) order for run_full_pipeline
+    - settings.json  : caller settings + stage parameters + environment + seed + measured latency
+    - capture.folded : sampled stacks of the slow run (if a sampler is given)
+    """
+    # mkdtemp garantit un dossier unique, même pour deux captures dans la même seconde
+    os.makedirs(directory, exist_ok=True)
+    prefix = time.strftime("%Y%m%d-%H%M%S") + f"-{int(elapsed_ms)}ms-"
+    bundle = tempfile.mkdtemp(prefix=prefix, dir=directory)
+
+    image = np.asarray(image)
+    np.save(os.path.join(bundle, "input.npy"), image)
+
+    color_order = settings.get("color_order", "BGR")
+    if image.ndim == 3 and image.shape[2] == 3 and color_order == "RGB":
+        png = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    elif image.ndim == 3 and image.shape[2] == 4 and color_order == "RGB":
+        png = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
+    else:
+        png = image
+    cv2.imwrite(os.path.join(bundle, "input.png"), png)
+
+    with open(os.path.join(bundle, "settings.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "settings": settings,
+            "stages": stage_settings(),
+            "environment": environment_settings(),
+            "seed": seed,
+            "elapsed_ms": float(elapsed_ms),
+            "shape": list(image.shape),
+            "dtype": str(image.dtype),
+        }, f, indent=2)
+
+    if sampler is not None:
+        sampler.write_folded(os.path.join(bundle, "capture.folded"))
+
+    return bundle
+
+
+def load_bundle(bundle):
+    """
+    Load a bundle written by save_bundle.
+    Returns (image, metadata).
+    """
+    image = np.load(os.path.join(bundle, "input.npy"))
+    with open(os.path.join(bundle, "settings.json"), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    return image, metadata
+
+
+class SlowDocumentCapture:
+    """
+    Opt-in hook: profiles each run with a StackSampler and, if the run is slower
+    than `threshold_ms`, saves a replayable bundle (see save_bundle).
+    Each run is seeded with a fresh seed, recorded in the bundle for the replay.
+    """
+
+    def __init__(self, directory, threshold_ms=5000, interval=0.005):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.last_bundle = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Enabled only if DIGITUP_SLOW_MS is set (DIGITUP_SLOW_DIR = output directory).
+        An invalid value disables the capture with a warning.
+        """
+        threshold = os.environ.get("DIGITUP_SLOW_MS")
+        if not threshold:
+            return None
+
+        try:
+            threshold_ms = float(threshold)
+        except ValueError:
+            logger.warning("DIGITUP_SLOW_MS invalide (%r, attendu : millisecondes) : capture désactivée", threshold)
+            return None
+
+        return cls(os.environ.get("DIGITUP_SLOW_DIR", "slow_documents"), threshold_ms)
+
+    def run(self, fn, image, settings=None):
+        """
+        Run fn(image) and capture a bundle if it exceeds the latency threshold.
+        A failing capture is logged and never replaces the result of fn.
+        """
+        seed = int.from_bytes(os.urandom(4), "little")
+        seed_everything(seed)
+
+        sampler = StackSampler(self.interval).start()
+        start = time.perf_counter()
+        try:
+            return fn(image)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            sampler.stop()
+
+            if elapsed_ms > self.threshold_ms:
+                try:
+                    self.last_bundle = save_bundle(
+                        self.directory, image, settings or {}, elapsed_ms, sampler, seed
+                    )
+                except Exception:
+                    logger.exception("Échec de la capture du document lent (%s)", self.directory)
@@ -2,6 +2,11 @@
 import cv2
 import numpy as np
 
+# Bande de signature (à partir de 70 % de la hauteur) et seuils d'encre
+BAND_START = 0.70
+INK_GRAY = 180
+INK_RATIO = 0.005
+
 
 def detect_signature_zone(image):
     """
@@ -11,7 +16,7 @@ def detect_signature_zone(image):
     """
     try:
         h, w, _ = image.shape
-        y1 = int(h * 0.70)
+        y1 = int(h * BAND_START)
 
         # Retourner une liste (même avec une seule zone)
         return [(0, y1, w, h - y1)]
@@ -52,7 +57,7 @@ def check_signature_presence(image, signature_zones):
             return False
 
         gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-        thresh = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY_INV)[1]
+        thresh = cv2.threshold(gray, INK_GRAY, 255, cv2.THRESH_BINARY_INV)[1]
 
         ink_pixels = np.sum(thresh > 0)
         total_pixels = thresh.size
@@ -60,7 +65,7 @@ def check_signature_presence(image, signature_zones):
         ink_ratio = ink_pixels / total_pixels
 
         # Seuil simple : si assez d'encre, on considère qu'il y a signature
-        presence = ink_ratio > 0.005
+        presence = ink_ratio > INK_RATIO
 
         return presence
 
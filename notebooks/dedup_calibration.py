@@ -0,0 +1,207 @@
+# dedup_calibration.py
+#
+# Calibration des seuils de app/dedup.py sur des formulaires synthétiques :
+#   PYTHONPATH=app python notebooks/dedup_calibration.py
+#
+# Un modèle de formulaire est rempli avec des contenus aléatoires (autres
+# exemplaires), puis certains exemplaires sont "rescannés" (décalage, dpi,
+# rotation, luminosité, bruit, JPEG q60). Le script affiche, pour chaque seuil,
+# la distribution mesurée sur les rescans (à accepter) et sur les autres
+# exemplaires (à rejeter).
+
+import random
+import string
+import time
+
+import cv2
+import numpy as np
+
+import dedup
+
+W, H = 1240, 1754
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# (décalage px, facteur dpi, rotation en degrés)
+RESCANS = [
+    (5, 1.0, 0.0),
+    (20, 0.8, 1.0),
+    (40, 1.0, 0.0),
+    (10, 1.3, 0.5),
+    (20, 0.75, -1.0),
+]
+
+
+def _word(n):
+    return "".join(random.choice(string.ascii_letters) for _ in range(n))
+
+
+def template():
+    img = np.full((H, W, 3), 255, np.uint8)
+    cv2.putText(img, "FORMULAIRE D'INSCRIPTION", (250, 120), FONT, 1.5, (0, 0, 0), 3)
+    for i, label in enumerate(["Nom :", "Prenom :", "Adresse :", "Ville :", "Telephone :"]):
+        y = 260 + i * 110
+        cv2.putText(img, label, (100, y), FONT, 1, (0, 0, 0), 2)
+        cv2.line(img, (350, y + 8), (1100, y + 8), (0, 0, 0), 1)
+    for i, label in enumerate(["Oui", "Non", "Autre"]):
+        x = 150 + i * 300
+        cv2.rectangle(img, (x, 900), (x + 40, 940), (0, 0, 0), 2)
+        cv2.putText(img, label, (x + 60, 935), FONT, 1, (0, 0, 0), 2)
+    cv2.putText(img, "Signature :", (100, 1300), FONT, 1, (0, 0, 0), 2)
+    cv2.rectangle(img, (100, 1330), (700, 1600), (0, 0, 0), 1)
+    return img
+
+
+def fill(img, seed):
+    random.seed(seed)
+    img = img.copy()
+    for i in range(5):
+        text = _word(random.randint(6, 14)) + " " + _word(random.randint(4, 8))
+        cv2.putText(img, text, (370, 260 + i * 110), FONT, 1, (20, 20, 120), 2)
+
+    x = 150 + random.randrange(3) * 300
+    cv2.line(img, (x + 5, 905), (x + 35, 935), (0, 0, 0), 3)
+    cv2.line(img, (x + 35, 905), (x + 5, 935), (0, 0, 0), 3)
+
+    freq = random.uniform(0.5, 1.5)
+    pts = np.array([[150 + j * 20, 1450 + int(40 * np.sin(j * freq))] for j in range(25)], np.int32)
+    cv2.polylines(img, [pts], False, (0, 0, 0), 2)
+    return img
+
+
+def name_form(name, checkbox=False):
+    """
+    Formulaire où seul le nom change (cas DUPONT / DURAND).
+    """
+    img = np.full((1400, 1000, 3), 255, np.uint8)
+    cv2.putText(img, "DEMANDE", (300, 100), FONT, 1.5, (0, 0, 0), 3)
+    for i, label in enumerate(["Nom :", "Prenom :", "Ne le :"]):
+        cv2.putText(img, label, (80, 250 + i * 90), FONT, 0.9, (0, 0, 0), 2)
+        cv2.line(img, (280, 258 + i * 90), (900, 258 + i * 90), (0, 0, 0), 1)
+    cv2.putText(img, name, (300, 250), FONT, 0.9, (20, 20, 120), 2)
+    cv2.putText(img, "Jean", (300, 340), FONT, 0.9, (20, 20, 120), 2)
+    cv2.putText(img, "01/02/1990", (300, 430), FONT, 0.9, (20, 20, 120), 2)
+    if checkbox:
+        cv2.rectangle(img, (100, 600), (130, 630), (0, 0, 0), 2)
+    cv2.putText(img, "Signature :", (80, 1100), FONT, 0.9, (0, 0, 0), 2)
+    return img
+
+
+def rescan(img, seed, shift=5, scale=1.0, angle=0.0):
+    rng = np.random.default_rng(seed)
+    h, w = img.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    M[0, 2] += shift
+    M[1, 2] += shift * rng.uniform(-1, 1)
+    out = cv2.warpAffine(img, M, (w, h), borderValue=(255, 255, 255))
+    if scale != 1.0:
+        out = cv2.resize(out, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    out = out.astype(np.float32) * rng.uniform(0.85, 1.0) + rng.normal(0, 6, out.shape)
+    _, jpeg = cv2.imencode(".jpg", np.uint8(np.clip(out, 0, 255)), [cv2.IMWRITE_JPEG_QUALITY, 60])
+    return cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+
+
+def summary(name, values):
+    values = np.asarray(values, dtype=np.float64)
+    print(f"  {name:<32} min {values.min():8.4f}  max {values.max():8.4f}  n={len(values)}")
+
+
+def calibrate(n_copies=40, n_rescanned=10):
+    base = template()
+    copies = [fill(base, seed) for seed in range(n_copies)]
+
+    index = dedup.DuplicateIndex()
+    hashes, thumbs = [], []
+    for i, img in enumerate(copies):
+        hashes.append(dedup.compute_phash(img))
+        thumbs.append(dedup.page_thumbnail(img))
+        index.add(hashes[-1], thumbs[-1], dedup.page_digest(img), img.shape, {"id": i})
+
+    print(f"{len(index.template_members)} modèle(s) pour {len(copies)} exemplaires")
+
+    phash_rescan, coverage_rescan, code_rescan, code_other = [], [], [], []
+    gate_rescan, gate_other = [], []
+    found = 0
+
+    for i in range(n_rescanned):
+        for k, (shift, scale, angle) in enumerate(RESCANS):
+            img = rescan(copies[i], 100 * i + k, shift, scale, angle)
+            page_hash = dedup.compute_phash(img)
+            thumb = dedup.page_thumbnail(img)
+            phash_rescan.append(dedup.hamming_distance(page_hash, hashes[i]))
+
+            rep, ink = index._template(index.entry_template[i])
+            aligned = dedup.align_on(rep, thumb)
+            coverage_rescan.append(dedup.template_coverage(aligned, ink))
+            code = dedup.content_code(aligned, ink)
+            for j in range(n_copies):
+                dist = dedup.hamming_distance(code, index.entry_code[j])
+                (code_rescan if j == i else code_other).append(dist)
+
+            for j in range(n_copies):
+                warp = dedup.register(thumbs[j], thumb)
+                if warp is None:
+                    continue
+                diff = dedup.content_distance(thumbs[j], thumb, warp)
+                (gate_rescan if j == i else gate_other).append(diff)
+
+            found += any(entry == i for entry, _ in index.verified_candidates(page_hash, thumb))
+
+    gate_rescan, gate_other = np.array(gate_rescan), np.array(gate_other)
+    print("pHash, rescan / original (TEMPLATE_DISTANCE = %d)" % dedup.TEMPLATE_DISTANCE)
+    summary("bits", phash_rescan)
+    print("Couverture du modèle (TEMPLATE_COVERAGE = %.2f)" % dedup.TEMPLATE_COVERAGE)
+    summary("rescans", coverage_rescan)
+    rep, ink = index._template(0)
+    summary("autre formulaire", [
+        dedup.template_coverage(dedup.align_on(rep, dedup.page_thumbnail(name_form(name))), ink)
+        for name in ("DUPONT", "DURAND", "MARTIN")
+    ])
+    print("Code de contenu (CONTENT_RADIUS = %d)" % dedup.CONTENT_RADIUS)
+    summary("rescans", code_rescan)
+    summary("autres exemplaires", code_other)
+    print("Filtre miniature (CONTENT_DISTANCE = %.3f, BLOCK_DISTANCE = %.1f)"
+          % (dedup.CONTENT_DISTANCE, dedup.BLOCK_DISTANCE))
+    summary("rescans, global", gate_rescan[:, 0])
+    summary("rescans, bloc", gate_rescan[:, 1])
+    summary("autres exemplaires, global", gate_other[:, 0])
+    summary("autres exemplaires, bloc", gate_other[:, 1])
+    print(f"  rescans retrouvés par verified_candidates : {found}/{n_rescanned * len(RESCANS)}")
+
+
+def name_forms():
+    """
+    Pages qui ne diffèrent que par quelques lettres : le filtre miniature ne
+    peut pas les séparer, c'est la relecture des mots (ocr.recheck_words) qui
+    tranche.
+    """
+    reference = dedup.page_thumbnail(name_form("DUPONT"))
+    print("Formulaires nominatifs (relecture des mots obligatoire)")
+    for name, checkbox in (("DURAND", False), ("DUPOND", False), ("MARTIN", True)):
+        thumb = dedup.page_thumbnail(name_form(name, checkbox))
+        warp = dedup.register(reference, thumb)
+        global_diff, local_diff = dedup.content_distance(reference, thumb, warp)
+        passes = global_diff <= dedup.CONTENT_DISTANCE and local_diff <= dedup.BLOCK_DISTANCE
+        print(f"  DUPONT / {name:<8} global {global_diff:.4f}  bloc {local_diff:.2f}  filtre {'passé' if passes else 'rejeté'}")
+
+
+def bench_query(n=200000):
+    """
+    Requête bornée sur n exemplaires d'un même modèle (codes proches les uns des autres).
+    """
+    rng = np.random.default_rng(0)
+    base = int(rng.integers(0, 2 ** 63))
+    index = dedup.HashIndex()
+    for i in range(n):
+        flips = rng.choice(64, size=int(rng.integers(8, 20)), replace=False)
+        index.add(base ^ int(sum(1 << int(b) for b in flips)), i)
+
+    start = time.perf_counter()
+    results = index.query(base, dedup.CONTENT_RADIUS, limit=dedup.MAX_CANDIDATES, max_scan=dedup.MAX_SCAN)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Requête sur {n} codes : {len(results)} candidats en {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    calibrate()
+    name_forms()
+    bench_query()
@@ -2,9 +2,10 @@
 
 import cv2
 
-from ocr import extract_text
-from signature import check_signature_presence
+from ocr import extract_text, recheck_words
+from signature import detect_signature_zone, check_signature_presence
 from fusion import fuse_results
+from dedup import compute_phash, page_digest, page_thumbnail, map_box
 
 # Modules optionnels (si tu les ajoutes plus tard)
 try:
@@ -20,10 +21,11 @@ except:
         return []
         
 
-def run_full_pipeline(image_path):
+def run_full_pipeline(image_path, index=None):
     """
     Run all processing steps:
     - Load image
+    - Duplicate lookup (if a DuplicateIndex is given)
     - OCR extraction
     - Signature detection
     - Photo detection
@@ -36,11 +38,43 @@ def run_full_pipeline(image_path):
     if image is None:
         raise ValueError(f"Impossible de lire l’image : {image_path}")
 
+    # 1b. Page déjà traitée à l'identique : le résultat est réutilisé tel quel
+    digest = None
+    if index is not None:
+        digest = page_digest(image)
+        entry = index.find_exact(digest)
+        if entry is not None:
+            result = index.result(entry)
+            result["duplicate_of"] = entry
+            return result
+
     # 2. OCR extraction
-    ocr_text, ocr_conf = extract_text(image)
+    # Pour un rescan probable, l'OCR de l'exemplaire déjà traité n'est qu'un
+    # candidat : ses boîtes sont recalées sur la page et relues une à une
+    ocr = None
+    duplicate_of = None
+    if index is not None:
+        page_hash = compute_phash(image)
+        thumb = page_thumbnail(image)
+
+        for entry, warp in index.verified_candidates(page_hash, thumb):
+            words = index.result(entry).get("words", [])
+            for word in words:
+                word["box"] = map_box(word["box"], warp, index.shape(entry), image.shape)
+
+            ocr = recheck_words(image, words)
+            if ocr is not None:
+                duplicate_of = entry
+                break
+
+    if ocr is None:
+        ocr = extract_text(image, return_words=True)
+    ocr_text, ocr_conf, words, lines = ocr
 
     # 3. Signature detection
-    signature_present, signature_score = check_signature_presence(image)
+    signature_zones = detect_signature_zone(image)
+    signature_present = bool(check_signature_presence(image, signature_zones))
+    signature_score = 1.0 if signature_present else 0.0
 
     # 4. Photo detection (fallback = False)
     photo_found = detect_photo(image)
@@ -55,9 +89,19 @@ def run_full_pipeline(image_path):
         signature_present=signature_present,
         signature_score=signature_score,
         photo_found=photo_found,
-        checkboxes=checkboxes
+        checkboxes=checkboxes,
+        words=words,
+        lines=lines,
+        signature_zones=signature_zones
     )
 
+    # Seuls les résultats calculés entièrement sont indexés : un résultat
+    # dérivé d'une autre entrée propagerait son OCR de proche en proche
+    if duplicate_of is not None:
+        result["duplicate_of"] = duplicate_of
+    elif index is not None:
+        index.add(page_hash, thumb, digest, image.shape, result)
+
     return result
 
 
@@ -0,0 +1,162 @@
+# replay.py
+#
+# Rejoue un document lent capturé par SlowDocumentCapture :
+#   PYTHONPATH=app python src/replay.py slow_documents/<bundle>
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+
+import cv2
+
+from pipeline import run_full_pipeline
+from profiler import StackSampler, environment_settings, load_bundle, seed_everything, stage_settings
+
+# Fonctions de chaque étape, pour le résumé par étape
+STAGE_FUNCTIONS = {
+    "ocr": "extract_text",
+    "signature_zone": "detect_signature_zone",
+    "signature": "check_signature_presence",
+    "photo": "detect_photo",
+    "checkbox": "detect_checkboxes",
+    "fusion": "fuse_results",
+}
+
+
+def stage_timings(stats):
+    """
+    Cumulative time (ms) spent in each pipeline stage, from cProfile stats.
+    """
+    timings = {}
+    for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        for stage, name in STAGE_FUNCTIONS.items():
+            if func == name:
+                timings[stage] = timings.get(stage, 0.0) + ct * 1000
+    return timings
+
+
+def environment_differences(recorded, current):
+    """
+    Library versions that differ between the capture and this machine.
+    Returns [(name, recorded, current), ...]
+    """
+    differences = []
+    for name in ("python", "opencv", "numpy", "torch", "easyocr"):
+        if recorded.get(name) != current.get(name):
+            differences.append((name, recorded.get(name), current.get(name)))
+    return differences
+
+
+def stage_differences(recorded, current):
+    """
+    Stage parameters that differ between the capture and this checkout.
+    Returns [(stage, name, recorded, current), ...]
+    """
+    # Même représentation que dans settings.json (tuples -> listes)
+    current = json.loads(json.dumps(current))
+
+    differences = []
+    for stage in sorted(set(recorded) | set(current)):
+        before, after = recorded.get(stage, {}), current.get(stage, {})
+        for name in sorted(set(before) | set(after)):
+            if before.get(name) != after.get(name):
+                differences.append((stage, name, before.get(name), after.get(name)))
+    return differences
+
+
+def restore_threads(recorded):
+    """
+    Apply the thread counts recorded at capture time (OpenCV, torch).
+    """
+    if "cv2_threads" in recorded:
+        cv2.setNumThreads(recorded["cv2_threads"])
+
+    if "torch_threads" in recorded:
+        try:
+            import torch
+            torch.set_num_threads(recorded["torch_threads"])
+        except ImportError:
+            pass
+
+
+def replay(bundle, interval=0.001):
+    """
+    Rerun a bundle through run_full_pipeline with the same input, seed
+    (random, numpy, torch) and thread counts as the capture. Timings are not
+    bit-for-bit reproducible (torch / EasyOCR kernels, machine load), only
+    comparable between replays.
+    Writes in the bundle: replay.prof (cProfile), replay.folded (flame-graph
+    stacks) and replay.<stage>.folded (stacks of each stage, see STAGE_FUNCTIONS).
+    """
+    image, metadata = load_bundle(bundle)
+
+    # Même graine et mêmes nombres de threads que lors de la capture
+    if metadata.get("seed") is not None:
+        seed_everything(metadata["seed"])
+    restore_threads(metadata["environment"])
+
+    image_path = os.path.join(bundle, "input.png")
+
+    profile = cProfile.Profile()
+    sampler = StackSampler(interval).start()
+    start = time.perf_counter()
+
+    profile.enable()
+    try:
+        result = run_full_pipeline(image_path)
+    finally:
+        profile.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        sampler.stop()
+
+        profile.dump_stats(os.path.join(bundle, "replay.prof"))
+        sampler.write_folded(os.path.join(bundle, "replay.folded"))
+        for stage, name in STAGE_FUNCTIONS.items():
+            sampler.write_folded(os.path.join(bundle, f"replay.{stage}.folded"), root=name)
+
+    stats = pstats.Stats(profile)
+    return result, elapsed_ms, stage_timings(stats), stats
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("Usage : python src/replay.py <bundle>")
+        return 1
+
+    bundle = argv[1]
+    _, metadata = load_bundle(bundle)
+
+    settings = metadata.get("settings", {})
+    print("Réglages capturés :")
+    for name in ("source", "color_order", "image_mode"):
+        print(f"  {name:<12} {settings.get(name)}")
+    print(f"  {'seed':<12} {metadata.get('seed')}")
+    for stage, params in metadata.get("stages", {}).items():
+        print(f"  {stage:<12} {params}")
+
+    if metadata.get("seed") is None:
+        print("ATTENTION : aucune graine enregistrée à la capture")
+    for name, recorded, current in environment_differences(metadata["environment"], environment_settings()):
+        print(f"ATTENTION : {name} {recorded} à la capture, {current} ici : timings non comparables")
+    for stage, name, recorded, current in stage_differences(metadata.get("stages", {}), stage_settings()):
+        print(f"ATTENTION : {stage}.{name} = {recorded} à la capture, {current} ici")
+
+    result, elapsed_ms, timings, stats = replay(bundle)
+
+    # La capture mesure l'analyse de l'application (run_analysis), le replay
+    # passe par run_full_pipeline : ce ne sont pas les mêmes chemins de code
+    print(f"Capture ({settings.get('source', '?')}, run_analysis) : {metadata['elapsed_ms']:.0f} ms")
+    print(f"Replay (run_full_pipeline) : {elapsed_ms:.0f} ms -- chemin de code différent, ordre de grandeur seulement")
+    for stage, ms in timings.items():
+        print(f"  {stage:<14} {ms:8.1f} ms")
+
+    stats.sort_stats("cumulative").print_stats(20)
+    print(f"Flame graph : {os.path.join(bundle, 'replay.folded')} (par étape : replay.<étape>.folded)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))